@@ -0,0 +1,20 @@
+import sys
+from unittest.mock import MagicMock
+
+import pytest
+
+# Replace boto3 once at collection time, before any test module imports counter
+sys.modules["boto3"] = MagicMock()
+
+
+@pytest.fixture(autouse=True)
+def reset_counter():
+    """Reset the mock DynamoDB client and the visit buffers around each test."""
+    import counter
+
+    counter.dynamodb.reset_mock(side_effect=True, return_value=True)
+    counter._pending.clear()
+    counter._counts.clear()
+    yield counter.dynamodb
+    # Leave nothing pending for the module's atexit flush
+    counter._pending.clear()
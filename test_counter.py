@@ -1,25 +1,12 @@
 import json
-import sys
-from unittest.mock import patch, MagicMock
+import time
 
-import pytest
 from botocore.exceptions import ClientError
 
-# Mock boto3 before importing counter module
-mock_dynamodb = MagicMock()
-mock_table = MagicMock()
-mock_dynamodb.Table.return_value = mock_table
+import counter
+from counter import lambda_handler
 
-with patch.dict(sys.modules, {"boto3": MagicMock()}):
-    with patch("boto3.resource", return_value=mock_dynamodb):
-        from counter import lambda_handler
-
-
-@pytest.fixture(autouse=True)
-def reset_mock_table():
-    """Reset the mock DynamoDB table before each test."""
-    mock_table.reset_mock(side_effect=True, return_value=True)
-    yield mock_table
+mock_dynamodb = counter.dynamodb
 
 
 class TestLambdaHandler:
@@ -27,7 +14,7 @@ class TestLambdaHandler:
 
     def test_default_path_becomes_index_html(self):
         """Test that default/root path becomes /index.html."""
-        mock_table.update_item.return_value = {"Attributes": {"visit_count": 1}}
+        mock_dynamodb.update_item.return_value = {"Attributes": {"visit_count": {"N": "1"}}}
 
         event = {"body": "{}"}
         response = lambda_handler(event, None)
@@ -39,7 +26,7 @@ class TestLambdaHandler:
 
     def test_root_path_becomes_index_html(self):
         """Test that '/' path is converted to /index.html."""
-        mock_table.update_item.return_value = {"Attributes": {"visit_count": 1}}
+        mock_dynamodb.update_item.return_value = {"Attributes": {"visit_count": {"N": "1"}}}
 
         event = {"body": json.dumps({"path": "/"})}
         response = lambda_handler(event, None)
@@ -50,7 +37,7 @@ class TestLambdaHandler:
 
     def test_custom_path(self):
         """Test with a custom path."""
-        mock_table.update_item.return_value = {"Attributes": {"visit_count": 5}}
+        mock_dynamodb.update_item.return_value = {"Attributes": {"visit_count": {"N": "5"}}}
 
         event = {"body": json.dumps({"path": "/about"})}
         response = lambda_handler(event, None)
@@ -60,11 +47,11 @@ class TestLambdaHandler:
         assert body["path"] == "/about"
         assert body["visit_count"] == 5
 
-    def test_body_as_dict(self):
-        """Test when body is already a dict (not JSON string)."""
-        mock_table.update_item.return_value = {"Attributes": {"visit_count": 3}}
+    def test_api_gateway_event_body(self):
+        """Test with the JSON string body API Gateway sends."""
+        mock_dynamodb.update_item.return_value = {"Attributes": {"visit_count": {"N": "3"}}}
 
-        event = {"body": {"path": "/contact"}}
+        event = {"body": json.dumps({"path": "/contact"})}
         response = lambda_handler(event, None)
 
         assert response["statusCode"] == 200
@@ -74,7 +61,7 @@ class TestLambdaHandler:
 
     def test_missing_body_uses_default(self):
         """Test with no body in event uses default path."""
-        mock_table.update_item.return_value = {"Attributes": {"visit_count": 1}}
+        mock_dynamodb.update_item.return_value = {"Attributes": {"visit_count": {"N": "1"}}}
 
         event = {}
         response = lambda_handler(event, None)
@@ -83,18 +70,65 @@ class TestLambdaHandler:
         body = json.loads(response["body"])
         assert body["path"] == "/index.html"
 
+    def test_null_body_uses_default(self):
+        """Test that a null body, as sent for bodiless requests, uses default path."""
+        mock_dynamodb.update_item.return_value = {"Attributes": {"visit_count": {"N": "1"}}}
+
+        event = {"body": None}
+        response = lambda_handler(event, None)
+
+        assert response["statusCode"] == 200
+        body = json.loads(response["body"])
+        assert body["path"] == "/index.html"
+
     def test_empty_path_returns_400(self):
         """Test that empty string path returns 400 error."""
         event = {"body": json.dumps({"path": ""})}
         response = lambda_handler(event, None)
 
         assert response["statusCode"] == 400
+        assert response["headers"]["Access-Control-Allow-Origin"] == "*"
         body = json.loads(response["body"])
         assert body["error"] == "Missing path parameter"
 
+    def test_null_path_returns_400(self):
+        """Test that a null path returns 400 error."""
+        event = {"body": json.dumps({"path": None})}
+        response = lambda_handler(event, None)
+
+        assert response["statusCode"] == 400
+        mock_dynamodb.update_item.assert_not_called()
+
+    def test_non_string_path_returns_400(self):
+        """Test that a non-string path returns 400 error."""
+        for path in (42, ["/about"], {"path": "/about"}):
+            event = {"body": json.dumps({"path": path})}
+            response = lambda_handler(event, None)
+
+            assert response["statusCode"] == 400
+        mock_dynamodb.update_item.assert_not_called()
+
+    def test_non_object_body_returns_400(self):
+        """Test that a JSON body that is not an object returns 400 error."""
+        event = {"body": json.dumps(["/about"])}
+        response = lambda_handler(event, None)
+
+        assert response["statusCode"] == 400
+        assert json.loads(response["body"])["error"] == "Invalid JSON body"
+
+    def test_malformed_body_returns_400(self):
+        """Test that a body that is not valid JSON returns 400 error."""
+        for raw in ("not json", '{"path": "/x"'):
+            response = lambda_handler({"body": raw}, None)
+
+            assert response["statusCode"] == 400
+            assert response["headers"]["Access-Control-Allow-Origin"] == "*"
+            assert json.loads(response["body"])["error"] == "Invalid JSON body"
+        mock_dynamodb.update_item.assert_not_called()
+
     def test_cors_headers_present(self):
         """Test that CORS headers are present in response."""
-        mock_table.update_item.return_value = {"Attributes": {"visit_count": 1}}
+        mock_dynamodb.update_item.return_value = {"Attributes": {"visit_count": {"N": "1"}}}
 
         event = {"body": "{}"}
         response = lambda_handler(event, None)
@@ -102,9 +136,18 @@ class TestLambdaHandler:
         assert response["headers"]["Access-Control-Allow-Origin"] == "*"
         assert response["headers"]["Content-Type"] == "application/json"
 
+    def test_response_is_json_serializable(self):
+        """Test that the response survives the runtime's JSON encoding."""
+        mock_dynamodb.update_item.return_value = {"Attributes": {"visit_count": {"N": "1"}}}
+
+        response = lambda_handler({"body": "{}"}, None)
+
+        assert isinstance(response["body"], str)
+        json.dumps(response)
+
     def test_dynamodb_client_error(self):
         """Test DynamoDB ClientError handling."""
-        mock_table.update_item.side_effect = ClientError(
+        mock_dynamodb.update_item.side_effect = ClientError(
             {"Error": {"Code": "500", "Message": "DynamoDB error"}}, "UpdateItem"
         )
 
@@ -112,12 +155,13 @@ class TestLambdaHandler:
         response = lambda_handler(event, None)
 
         assert response["statusCode"] == 500
+        assert response["headers"]["Access-Control-Allow-Origin"] == "*"
         body = json.loads(response["body"])
         assert "error" in body
 
     def test_generic_exception_handling(self):
         """Test generic exception handling."""
-        mock_table.update_item.side_effect = Exception("Unexpected error")
+        mock_dynamodb.update_item.side_effect = Exception("Unexpected error")
 
         event = {"body": json.dumps({"path": "/test"})}
         response = lambda_handler(event, None)
@@ -129,24 +173,23 @@ class TestLambdaHandler:
 
     def test_dynamodb_update_item_called_correctly(self):
         """Test that DynamoDB update_item is called with correct parameters."""
-        mock_table.update_item.return_value = {"Attributes": {"visit_count": 1}}
+        mock_dynamodb.update_item.return_value = {"Attributes": {"visit_count": {"N": "1"}}}
 
         event = {"body": json.dumps({"path": "/projects"})}
         lambda_handler(event, None)
 
-        mock_table.update_item.assert_called_once_with(
-            Key={"path": "/projects"},
-            UpdateExpression="SET visit_count = if_not_exists(visit_count, :start) + :inc",
-            ExpressionAttributeValues={":inc": 1, ":start": 0},
+        mock_dynamodb.update_item.assert_called_once_with(
+            TableName="visitor-counts",
+            Key={"path": {"S": "/projects"}},
+            UpdateExpression="ADD visit_count :inc",
+            ExpressionAttributeValues={":inc": {"N": "1"}},
             ReturnValues="UPDATED_NEW",
         )
 
     def test_visit_count_returned_as_int(self):
         """Test that visit_count is returned as an integer."""
-        from decimal import Decimal
-
-        # DynamoDB returns Decimal type
-        mock_table.update_item.return_value = {"Attributes": {"visit_count": Decimal("42")}}
+        # The low-level client returns numbers as strings
+        mock_dynamodb.update_item.return_value = {"Attributes": {"visit_count": {"N": "42"}}}
 
         event = {"body": json.dumps({"path": "/test"})}
         response = lambda_handler(event, None)
@@ -157,7 +200,7 @@ class TestLambdaHandler:
 
     def test_json_body_parsing(self):
         """Test JSON body string is correctly parsed."""
-        mock_table.update_item.return_value = {"Attributes": {"visit_count": 1}}
+        mock_dynamodb.update_item.return_value = {"Attributes": {"visit_count": {"N": "1"}}}
 
         event = {"body": '{"path": "/blog/post-1"}'}
         response = lambda_handler(event, None)
@@ -168,7 +211,7 @@ class TestLambdaHandler:
 
     def test_nested_path(self):
         """Test with a deeply nested path."""
-        mock_table.update_item.return_value = {"Attributes": {"visit_count": 10}}
+        mock_dynamodb.update_item.return_value = {"Attributes": {"visit_count": {"N": "10"}}}
 
         event = {"body": json.dumps({"path": "/blog/2024/01/my-post"})}
         response = lambda_handler(event, None)
@@ -177,3 +220,124 @@ class TestLambdaHandler:
         body = json.loads(response["body"])
         assert body["path"] == "/blog/2024/01/my-post"
         assert body["visit_count"] == 10
+
+    def test_visits_buffered_until_flush_interval(self, monkeypatch):
+        """Test that visits within the flush interval are answered locally."""
+        monkeypatch.setattr(counter, "FLUSH_INTERVAL", 60.0)
+        monkeypatch.setattr(counter, "_last_flush", time.monotonic())
+        counter._counts["/about"] = 7
+
+        event = {"body": json.dumps({"path": "/about"})}
+        lambda_handler(event, None)
+        response = lambda_handler(event, None)
+
+        body = json.loads(response["body"])
+        assert body["visit_count"] == 9
+        mock_dynamodb.update_item.assert_not_called()
+
+    def test_write_through_mode_keeps_no_counts(self):
+        """Test that the default write-through mode caches no per-path counts."""
+        mock_dynamodb.update_item.return_value = {"Attributes": {"visit_count": {"N": "1"}}}
+
+        for i in range(50):
+            lambda_handler({"body": json.dumps({"path": f"/page-{i}"})}, None)
+
+        assert not counter._counts
+        assert not counter._pending
+
+    def test_count_cache_is_bounded(self, monkeypatch):
+        """Test that buffered mode evicts the least recently used counts."""
+        mock_dynamodb.update_item.return_value = {"Attributes": {"visit_count": {"N": "1"}}}
+        monkeypatch.setattr(counter, "FLUSH_INTERVAL", 60.0)
+        monkeypatch.setattr(counter, "_COUNTS_MAX", 3)
+        monkeypatch.setattr(counter, "_last_flush", time.monotonic())
+
+        for i in range(5):
+            lambda_handler({"body": json.dumps({"path": f"/page-{i}"})}, None)
+
+        assert list(counter._counts) == ["/page-2", "/page-3", "/page-4"]
+
+    def test_unseeded_path_writes_through(self, monkeypatch):
+        """Test that the first visit to a path is written even within the interval."""
+        mock_dynamodb.update_item.return_value = {"Attributes": {"visit_count": {"N": "1500"}}}
+        monkeypatch.setattr(counter, "FLUSH_INTERVAL", 60.0)
+        monkeypatch.setattr(counter, "_last_flush", time.monotonic())
+
+        event = {"body": json.dumps({"path": "/about"})}
+        first = lambda_handler(event, None)
+        second = lambda_handler(event, None)
+
+        assert json.loads(first["body"])["visit_count"] == 1500
+        assert json.loads(second["body"])["visit_count"] == 1501
+        mock_dynamodb.update_item.assert_called_once()
+        assert counter._pending == {"/about": 1}
+
+    def test_buffered_visits_flushed_as_one_update(self, monkeypatch):
+        """Test that pending visits are written in a single update per path."""
+        mock_dynamodb.update_item.return_value = {"Attributes": {"visit_count": {"N": "12"}}}
+        monkeypatch.setattr(counter, "FLUSH_INTERVAL", 60.0)
+        monkeypatch.setattr(counter, "_last_flush", time.monotonic() - 120)
+        counter._pending["/about"] = 2
+
+        event = {"body": json.dumps({"path": "/about"})}
+        response = lambda_handler(event, None)
+
+        body = json.loads(response["body"])
+        assert body["visit_count"] == 12
+        mock_dynamodb.update_item.assert_called_once()
+        values = mock_dynamodb.update_item.call_args.kwargs["ExpressionAttributeValues"]
+        assert values[":inc"] == {"N": "3"}
+        assert not counter._pending
+
+    def test_multiple_buffered_paths_flushed_per_path(self, monkeypatch):
+        """Test that each pending path is written with its own update."""
+        mock_dynamodb.update_item.side_effect = [
+            {"Attributes": {"visit_count": {"N": "1234"}}},
+            {"Attributes": {"visit_count": {"N": "5"}}},
+        ]
+        monkeypatch.setattr(counter, "FLUSH_INTERVAL", 60.0)
+        monkeypatch.setattr(counter, "_last_flush", time.monotonic() - 120)
+        counter._counts["/about"] = 4
+        counter._pending["/about"] = 1
+
+        event = {"body": json.dumps({"path": "/blog"})}
+        response = lambda_handler(event, None)
+
+        body = json.loads(response["body"])
+        assert body["visit_count"] == 1234
+        assert counter._counts["/about"] == 5
+        keys = [c.kwargs["Key"] for c in mock_dynamodb.update_item.call_args_list]
+        assert keys == [{"path": {"S": "/blog"}}, {"path": {"S": "/about"}}]
+
+    def test_failed_write_for_other_path_does_not_fail_request(self, monkeypatch):
+        """Test that a failed write for another buffered path is dropped and logged."""
+        mock_dynamodb.update_item.side_effect = [
+            {"Attributes": {"visit_count": {"N": "8"}}},
+            Exception("Unexpected error"),
+        ]
+        monkeypatch.setattr(counter, "FLUSH_INTERVAL", 60.0)
+        monkeypatch.setattr(counter, "_last_flush", time.monotonic() - 120)
+        counter._counts["/about"] = 4
+        counter._pending["/about"] = 1
+
+        event = {"body": json.dumps({"path": "/blog"})}
+        response = lambda_handler(event, None)
+
+        assert response["statusCode"] == 200
+        body = json.loads(response["body"])
+        assert body["visit_count"] == 8
+        assert not counter._pending
+
+    def test_failed_write_for_own_path_returns_500(self, monkeypatch):
+        """Test that a failed write for the request's path fails only that visit."""
+        mock_dynamodb.update_item.side_effect = Exception("Unexpected error")
+        monkeypatch.setattr(counter, "FLUSH_INTERVAL", 60.0)
+        monkeypatch.setattr(counter, "_last_flush", time.monotonic() - 120)
+        counter._counts["/about"] = 4
+        counter._pending["/about"] = 1
+
+        event = {"body": json.dumps({"path": "/blog"})}
+        response = lambda_handler(event, None)
+
+        assert response["statusCode"] == 500
+        assert counter._pending == {"/about": 1}